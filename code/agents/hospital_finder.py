@@ -8,11 +8,50 @@ for address geocoding. Both APIs are free and require no authentication.
 
 from __future__ import annotations
 
+import asyncio
+import csv
+import functools
+import io
 import math
+import os
 import re
+import sys
+import threading
+import time
+import unicodedata
+from types import MappingProxyType
+
+import numpy as np
 import requests
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter, Retry
 from typing import Any
 
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - optional dependency
+    ahocorasick = None
+
+try:
+    import diskcache
+except ImportError:  # pragma: no cover - optional dependency
+    diskcache = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # pragma: no cover - optional dependency
+    njit = None
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -22,11 +61,28 @@ NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 PHOTON_URL = "https://photon.komoot.io/api"
 USER_AGENT = "HealthGuardAI/1.0 (educational prototype)"
 
+# One pooled session for all three endpoints: keep-alive avoids a fresh
+# TCP+TLS handshake per call, and transient 429/5xx responses get retried
+# with backoff instead of surfacing as failures.
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "User-Agent": USER_AGENT,
+    # Overpass JSON compresses 3-5x; urllib3 decodes transparently
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept": "application/json",
+})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3,
+                      status_forcelist=[429, 502, 503, 504]),
+))
+
 # ---------------------------------------------------------------------------
 # Condition → Specialty Mapping
 # ---------------------------------------------------------------------------
 
-CONDITION_SPECIALTY_MAP: dict[str, dict] = {
+_CONDITION_SPECIALTY_RAW: dict[str, dict] = {
     "Community-Acquired Pneumonia (CAP)": {
         "specialty": "Pulmonology",
         "osm_tags": {
@@ -109,6 +165,75 @@ CONDITION_SPECIALTY_MAP: dict[str, dict] = {
     },
 }
 
+# Read-only view with interned keys: lookups hash pre-interned strings and
+# nothing downstream can mutate the mapping between requests
+CONDITION_SPECIALTY_MAP: MappingProxyType = MappingProxyType({
+    sys.intern(cond): MappingProxyType({
+        key: (MappingProxyType(val) if isinstance(val, dict) else val)
+        for key, val in info.items()
+    })
+    for cond, info in _CONDITION_SPECIALTY_RAW.items()
+})
+_CONDITION_KEYS = frozenset(CONDITION_SPECIALTY_MAP)
+
+# Lowered keys precomputed once so _match_condition_name does not re-lower
+# every map key per call
+_KEYS_LOWER: tuple[tuple[str, str], ...] = tuple(
+    (key.lower(), key) for key in CONDITION_SPECIALTY_MAP
+)
+_LOWER_TO_KEY: dict[str, str] = dict(_KEYS_LOWER)
+
+
+# ---------------------------------------------------------------------------
+# Response caching
+# ---------------------------------------------------------------------------
+# The public Overpass/Nominatim endpoints are rate-limited, and users often
+# repeat the same location query. A small in-memory dict answers repeat hits
+# within the process; diskcache (optional) persists bodies across restarts.
+# Coordinates are rounded to 3 decimals (~110 m buckets) so nearby clicks
+# share an entry.
+
+OVERPASS_CACHE_TTL = 24 * 3600   # hospital data changes rarely
+GEOCODE_CACHE_TTL = 7 * 24 * 3600
+SUGGEST_CACHE_TTL = 3600         # autocomplete prefixes repeat within a session
+
+_mem_cache: dict[tuple, tuple[float, Any]] = {}
+_disk_cache = None
+if diskcache is not None:
+    try:
+        _disk_cache = diskcache.Cache(
+            os.path.expanduser("~/.cache/healthguard"), size_limit=64 * 1024 * 1024
+        )
+    except Exception:
+        _disk_cache = None
+
+
+def _cache_get(key: tuple) -> Any | None:
+    entry = _mem_cache.get(key)
+    if entry is None and _disk_cache is not None:
+        entry = _disk_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, data = entry
+    if time.time() > expires_at:
+        return None
+    return data
+
+
+def _normalize_query(query: str) -> str:
+    """Normalize an autocomplete query so keystroke variants share a cache key."""
+    return unicodedata.normalize("NFKC", " ".join(query.strip().lower().split()))
+
+
+def _cache_put(key: tuple, data: Any, ttl: float) -> None:
+    entry = (time.time() + ttl, data)
+    _mem_cache[key] = entry
+    if _disk_cache is not None:
+        try:
+            _disk_cache.set(key, entry, expire=ttl)
+        except Exception:
+            pass
+
 
 # ---------------------------------------------------------------------------
 # Haversine distance
@@ -119,17 +244,83 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     Calculate great-circle distance between two points in kilometres
     using the Haversine formula.
     """
-    R = 6371.0  # Earth radius in km
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
+    if _haversine_scalar_jit is not None:
+        return _haversine_scalar_jit(lat1, lon1, lat2, lon2)
 
-    a = (math.sin(dphi / 2) ** 2 +
-         math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    R = 6371.0  # Earth radius in km
+    # Locals skip the module attribute lookup per trig call
+    radians, sin, cos = math.radians, math.sin, math.cos
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dlambda = radians(lon2 - lon1)
+
+    a = (sin(dphi / 2) ** 2 +
+         cos(phi1) * cos(phi2) * sin(dlambda / 2) ** 2)
+    # asin form: one transcendental instead of two sqrts + atan2; the min()
+    # guards float overshoot near antipodal points
+    c = 2 * math.asin(math.sqrt(min(1.0, a)))
     return R * c
 
 
+def haversine_distance_many(lat: float, lon: float,
+                            lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Haversine: distances in kilometres from one reference point
+    to many points, computed in a single NumPy expression instead of one
+    interpreted trig chain per point. Dispatches to the Numba kernel when
+    numba is installed. float32 inputs halve memory traffic and are still
+    good to well under the 10 m display rounding.
+    """
+    if _haversine_many_jit is not None:
+        return _haversine_many_jit(lat, lon,
+                                   np.ascontiguousarray(lats, dtype=np.float32),
+                                   np.ascontiguousarray(lons, dtype=np.float32))
+
+    phis = np.radians(lats)
+    dphi = np.radians(lats - lat)
+    dlam = np.radians(lons - lon)
+
+    a = (np.sin(dphi / 2) ** 2 +
+         math.cos(math.radians(lat)) * np.cos(phis) * np.sin(dlam / 2) ** 2)
+    return 2 * 6371.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+
+
+# Numba-compiled kernels: ~2 orders of magnitude over the interpreted scalar
+# for bulk callers. Compiled lazily in a daemon thread so import and the
+# first UI interaction never pay the JIT cost.
+_haversine_scalar_jit = None
+_haversine_many_jit = None
+
+if njit is not None:
+    def _compile_haversine_kernels() -> None:
+        global _haversine_scalar_jit, _haversine_many_jit
+
+        @njit(cache=True, fastmath=True)
+        def _scalar(lat1, lon1, lat2, lon2):
+            phi1 = math.radians(lat1)
+            phi2 = math.radians(lat2)
+            dphi = math.radians(lat2 - lat1)
+            dlam = math.radians(lon2 - lon1)
+            a = (math.sin(dphi / 2) ** 2 +
+                 math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2)
+            return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
+        @njit(cache=True, fastmath=True, parallel=True)
+        def _many(lat, lon, lats, lons):
+            out = np.empty(lats.size, dtype=np.float32)
+            for i in prange(lats.size):
+                out[i] = _scalar(lat, lon, lats[i], lons[i])
+            return out
+
+        # Warm up with a trivial call so the first real one is compiled
+        _many(0.0, 0.0, np.zeros(1, dtype=np.float32),
+              np.zeros(1, dtype=np.float32))
+        _haversine_scalar_jit = _scalar
+        _haversine_many_jit = _many
+
+    threading.Thread(target=_compile_haversine_kernels, daemon=True).start()
+
+
 # ---------------------------------------------------------------------------
 # Geocoding (Nominatim)
 # ---------------------------------------------------------------------------
@@ -139,19 +330,24 @@ def geocode_address(address: str) -> tuple[float, float] | None:
     Convert a text address / city name to (lat, lon) via Nominatim.
     Returns None if geocoding fails.
     """
+    cache_key = ("nominatim", _normalize_query(address))
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+
     params = {
         "q": address,
         "format": "json",
         "limit": 1,
     }
-    headers = {"User-Agent": USER_AGENT}
     try:
-        resp = requests.get(NOMINATIM_URL, params=params,
-                            headers=headers, timeout=10)
+        resp = _SESSION.get(NOMINATIM_URL, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         if data:
-            return float(data[0]["lat"]), float(data[0]["lon"])
+            coords = (float(data[0]["lat"]), float(data[0]["lon"]))
+            _cache_put(cache_key, coords, GEOCODE_CACHE_TTL)
+            return coords
         return None
     except (requests.RequestException, KeyError, IndexError, ValueError):
         return None
@@ -202,17 +398,20 @@ def fetch_location_suggestions(
     if not query or len(query.strip()) < 3:
         return []
 
+    cache_key = ("photon", _normalize_query(query), limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     params = {
         "q": query.strip(),
         "limit": limit,
     }
-    headers = {"User-Agent": USER_AGENT}
 
     try:
-        resp = requests.get(
+        resp = _SESSION.get(
             PHOTON_URL,
             params=params,
-            headers=headers,
             timeout=5,
         )
         resp.raise_for_status()
@@ -220,6 +419,13 @@ def fetch_location_suggestions(
     except (requests.RequestException, ValueError):
         return []
 
+    suggestions = _parse_photon_response(data)
+    _cache_put(cache_key, suggestions, SUGGEST_CACHE_TTL)
+    return suggestions
+
+
+def _parse_photon_response(data: dict) -> list[dict]:
+    """Convert a Photon GeoJSON body into deduplicated suggestion dicts."""
     suggestions: list[dict] = []
     seen_labels: set[str] = set()
 
@@ -247,61 +453,160 @@ def fetch_location_suggestions(
 # Hospital search (Overpass API)
 # ---------------------------------------------------------------------------
 
+@dataclass(slots=True)
+class Hospital:
+    """
+    One facility from the Overpass response. Slots keep the record compact
+    (fixed attribute storage instead of an 11-key dict per facility); the
+    mapping-style accessors preserve compatibility with display code that
+    does h["name"].
+    """
+    name: str
+    lat: float
+    lon: float
+    distance_km: float
+    type: str
+    address: str
+    phone: str
+    specialty: str
+    website: str
+    specialty_match: bool
+    emergency: bool
+
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+
 def get_nearby_hospitals(
     lat: float,
     lon: float,
     radius_km: float = 10,
     specialty_tags: dict | None = None,
-) -> list[dict]:
+) -> list[Hospital]:
     """
     Query the Overpass API for hospitals and clinics near the given
     coordinates.
 
-    Returns a list of dicts with keys:
+    Returns a list of Hospital records with fields:
         name, lat, lon, distance_km, type, address, phone,
         specialty, website, specialty_match, emergency
     """
-    radius_m = int(radius_km * 1000)
+    cache_key = ("overpass", round(lat, 3), round(lon, 3), int(radius_km * 1000))
+    data = _cache_get(cache_key)
+
+    if data is None:
+        query = _build_overpass_query(lat, lon, radius_km, csv_out=OVERPASS_USE_CSV)
+        try:
+            resp = _SESSION.post(
+                OVERPASS_URL,
+                data={"data": query},
+                timeout=30,
+            )
+            resp.raise_for_status()
+            if OVERPASS_USE_CSV:
+                data = _csv_to_elements(resp.text)
+            # Overpass bodies run to megabytes in dense areas; orjson parses
+            # resp.content several times faster than stdlib json on resp.text
+            elif orjson is not None:
+                data = orjson.loads(resp.content)
+            else:
+                data = resp.json()
+        except (requests.RequestException, ValueError):
+            return []
+        _cache_put(cache_key, data, OVERPASS_CACHE_TTL)
+
+    return _parse_overpass_response(data, lat, lon, specialty_tags, radius_km)
+
+
+# Opt-in CSV output: ~3-4x smaller than the JSON envelope for the fields we
+# read, at the cost of a less forgiving parse (delimiter collisions). JSON
+# stays the default.
+OVERPASS_USE_CSV = os.environ.get("HEALTHGUARD_OVERPASS_CSV", "") == "1"
+
+_CSV_FIELDS = (
+    "name", "::lat", "::lon", "amenity", "healthcare",
+    '"healthcare:speciality"', "phone", '"contact:phone"',
+    "website", '"contact:website"', "emergency",
+    '"addr:housenumber"', '"addr:street"', '"addr:city"',
+    '"addr:postcode"', '"addr:state"', '"addr:full"',
+)
+_CSV_DELIMITER = "\t"
+
+
+def _build_overpass_query(lat: float, lon: float, radius_km: float,
+                          csv_out: bool = False) -> str:
+    """
+    Build the broad Overpass QL query: all hospitals + clinics within radius.
 
-    # Broad query: all hospitals + clinics within radius
-    query = f"""
-    [out:json][timeout:25];
+    `nwr` covers node+way+relation in one statement and the tag regexes
+    union the amenity/healthcare values, so the server evaluates 2
+    statements instead of 11 and returns each element once.
+    """
+    radius_m = int(radius_km * 1000)
+    if csv_out:
+        header = (f'[out:csv({",".join(_CSV_FIELDS)};true;"{_CSV_DELIMITER}")]'
+                  "[timeout:25]")
+    else:
+        header = "[out:json][timeout:25]"
+    return f"""
+    {header};
     (
-      node["amenity"="hospital"](around:{radius_m},{lat},{lon});
-      way["amenity"="hospital"](around:{radius_m},{lat},{lon});
-      relation["amenity"="hospital"](around:{radius_m},{lat},{lon});
-      node["amenity"="clinic"](around:{radius_m},{lat},{lon});
-      way["amenity"="clinic"](around:{radius_m},{lat},{lon});
-      node["healthcare"="hospital"](around:{radius_m},{lat},{lon});
-      way["healthcare"="hospital"](around:{radius_m},{lat},{lon});
-      node["healthcare"="clinic"](around:{radius_m},{lat},{lon});
-      way["healthcare"="clinic"](around:{radius_m},{lat},{lon});
-      node["healthcare"="doctor"](around:{radius_m},{lat},{lon});
-      way["healthcare"="doctor"](around:{radius_m},{lat},{lon});
+      nwr["amenity"~"^(hospital|clinic)$"](around:{radius_m},{lat},{lon});
+      nwr["healthcare"~"^(hospital|clinic|doctor)$"](around:{radius_m},{lat},{lon});
     );
     out center tags;
     """
 
-    headers = {"User-Agent": USER_AGENT}
 
-    try:
-        resp = requests.post(
-            OVERPASS_URL,
-            data={"data": query},
-            headers=headers,
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-    except (requests.RequestException, ValueError):
-        return []
+def _csv_to_elements(text: str) -> dict:
+    """
+    Convert Overpass CSV output (tab-delimited, with header) into the
+    {"elements": [...]} shape _parse_overpass_response consumes, so both
+    output formats share one parse path. `::lat`/`::lon` arrive as the
+    "@lat"/"@lon" columns and cover way/relation centers too.
+    """
+    elements = []
+    for row in csv.DictReader(io.StringIO(text), delimiter=_CSV_DELIMITER):
+        lat_s = row.pop("@lat", "")
+        lon_s = row.pop("@lon", "")
+        try:
+            coords = {"lat": float(lat_s), "lon": float(lon_s)}
+        except ValueError:
+            continue
+        elements.append({**coords, "tags": {k: v for k, v in row.items() if v}})
+    return {"elements": elements}
+
+
+def _parse_overpass_response(
+    data: dict,
+    lat: float,
+    lon: float,
+    specialty_tags: dict | None = None,
+    radius_km: float | None = None,
+) -> list[Hospital]:
+    """
+    Convert an Overpass JSON body into Hospital records with distances.
 
-    hospitals: list[dict] = []
+    When radius_km is given, elements outside the radius bounding box are
+    rejected with two comparisons before any trig runs — relevant when a
+    cached response for a larger pull is reused for a smaller radius.
+    """
+    hospitals: list[Hospital] = []
     seen_names: set[str] = set()
 
+    # Hoisted out of the loop: the specialty target and a local binding for
+    # the bound method skip per-element work
+    target = ""
+    if specialty_tags and specialty_tags.get("healthcare:speciality"):
+        target = specialty_tags["healthcare:speciality"].lower()
+
     for element in data.get("elements", []):
         tags = element.get("tags", {})
-        name = tags.get("name", "").strip()
+        tags_get = tags.get
+        name = tags_get("name", "").strip()
         if not name or name in seen_names:
             continue
         seen_names.add(name)
@@ -312,48 +617,67 @@ def get_nearby_hospitals(
         if h_lat is None or h_lon is None:
             continue
 
-        # Type
-        amenity = tags.get("amenity", "")
-        healthcare = tags.get("healthcare", "")
-        if "hospital" in (amenity + " " + healthcare):
+        # Type: check the two tag values directly instead of building a
+        # temporary concatenated string per branch
+        amenity = tags_get("amenity", "")
+        healthcare = tags_get("healthcare", "")
+        if "hospital" in amenity or "hospital" in healthcare:
             h_type = "Hospital"
-        elif "clinic" in (amenity + " " + healthcare):
+        elif "clinic" in amenity or "clinic" in healthcare:
             h_type = "Clinic"
-        elif "doctor" in (amenity + " " + healthcare):
+        elif "doctor" in amenity or "doctor" in healthcare:
             h_type = "Doctor"
         else:
             h_type = "Medical Facility"
 
         # Specialty match
-        h_specialty = tags.get("healthcare:speciality", "")
-        specialty_match = False
-        if specialty_tags and specialty_tags.get("healthcare:speciality"):
-            target = specialty_tags["healthcare:speciality"].lower()
-            specialty_match = target in h_specialty.lower()
+        h_specialty = tags_get("healthcare:speciality", "")
+        specialty_match = bool(target) and target in h_specialty.lower()
 
         # Address from addr:* tags
-        addr_parts = []
-        for key in ["addr:housenumber", "addr:street", "addr:city",
-                     "addr:postcode", "addr:state"]:
-            if tags.get(key):
-                addr_parts.append(tags[key])
-        address = ", ".join(addr_parts) if addr_parts else tags.get("addr:full", "")
-
-        distance = haversine_distance(lat, lon, h_lat, h_lon)
-
-        hospitals.append({
-            "name": name,
-            "lat": h_lat,
-            "lon": h_lon,
-            "distance_km": round(distance, 2),
-            "type": h_type,
-            "address": address,
-            "phone": tags.get("phone", tags.get("contact:phone", "")),
-            "specialty": h_specialty,
-            "website": tags.get("website", tags.get("contact:website", "")),
-            "specialty_match": specialty_match,
-            "emergency": tags.get("emergency", "") == "yes",
-        })
+        addr_parts = [v for v in (tags_get("addr:housenumber"),
+                                  tags_get("addr:street"),
+                                  tags_get("addr:city"),
+                                  tags_get("addr:postcode"),
+                                  tags_get("addr:state")) if v]
+        address = ", ".join(addr_parts) if addr_parts else tags_get("addr:full", "")
+
+        hospitals.append(Hospital(
+            name=name,
+            lat=h_lat,
+            lon=h_lon,
+            distance_km=0.0,  # filled vectorized below
+            type=h_type,
+            address=address,
+            phone=tags_get("phone", tags_get("contact:phone", "")),
+            specialty=h_specialty,
+            website=tags_get("website", tags_get("contact:website", "")),
+            specialty_match=specialty_match,
+            emergency=tags_get("emergency", "") == "yes",
+        ))
+
+    # One vectorized distance pass over all parsed facilities instead of
+    # a per-element interpreted haversine call
+    if hospitals:
+        n = len(hospitals)
+        lats = np.fromiter((h.lat for h in hospitals), dtype=np.float32, count=n)
+        lons = np.fromiter((h.lon for h in hospitals), dtype=np.float32, count=n)
+
+        if radius_km is not None:
+            # Cheap bounding-box pre-mask (~111 km per degree of latitude);
+            # the box circumscribes the radius circle, so nothing inside the
+            # radius is ever dropped
+            dlat_max = radius_km / 111.0
+            dlon_max = radius_km / (111.0 * max(math.cos(math.radians(lat)), 1e-6))
+            keep = ((np.abs(lats - lat) <= dlat_max) &
+                    (np.abs(lons - lon) <= dlon_max))
+            if not keep.all():
+                hospitals = [h for h, k in zip(hospitals, keep) if k]
+                lats, lons = lats[keep], lons[keep]
+
+        distances = haversine_distance_many(lat, lon, lats, lons)
+        for h, d in zip(hospitals, distances):
+            h.distance_km = round(float(d), 2)
 
     return hospitals
 
@@ -362,70 +686,93 @@ def get_nearby_hospitals(
 # Condition name parsing from differential text
 # ---------------------------------------------------------------------------
 
+# Rule-based format: "## 1. Community-Acquired Pneumonia (CAP)"
+_RE_TOP_HEADING = re.compile(r'##\s*1\.\s*(.+)')
+# LLM format: "1. **Condition Name**" or "1. Condition Name"
+_RE_TOP_NUMBERED = re.compile(r'(?:^|\n)\s*1[\.\)]\s*\*{0,2}([^*\n]+)')
+
+
+@functools.lru_cache(maxsize=256)
 def _parse_top_condition(differential_text: str) -> str | None:
     """
     Extract the #1 ranked condition name from the differential diagnosis
-    markdown. Handles both rule-based and LLM output formats.
+    markdown. Handles both rule-based and LLM output formats. Memoized:
+    radius or location tweaks re-run recommend_hospitals on the same text.
     """
-    # Fallback format: "## 1. Community-Acquired Pneumonia (CAP)"
-    match = re.search(r'##\s*1\.\s*(.+)', differential_text)
+    match = _RE_TOP_HEADING.search(differential_text)
     if match:
         return match.group(1).strip()
 
-    # LLM format: "1. **Condition Name**" or "1. Condition Name"
-    match = re.search(r'(?:^|\n)\s*1[\.\)]\s*\*{0,2}([^*\n]+)', differential_text)
+    match = _RE_TOP_NUMBERED.search(differential_text)
     if match:
         return match.group(1).strip()
 
     return None
 
 
+KEYWORD_MAP: dict[str, str] = {
+    "pneumonia": "Community-Acquired Pneumonia (CAP)",
+    "heart failure": "Acute Heart Failure / Decompensated Heart Failure",
+    "coronary": "Acute Coronary Syndrome (ACS)",
+    "acs": "Acute Coronary Syndrome (ACS)",
+    "myocardial infarction": "Acute Coronary Syndrome (ACS)",
+    "stemi": "Acute Coronary Syndrome (ACS)",
+    "nstemi": "Acute Coronary Syndrome (ACS)",
+    "copd": "COPD Exacerbation",
+    "chronic obstructive": "COPD Exacerbation",
+    "asthma": "Asthma Exacerbation",
+    "pulmonary embolism": "Pulmonary Embolism (PE)",
+    "embolism": "Pulmonary Embolism (PE)",
+    "sepsis": "Sepsis",
+    "septic": "Sepsis",
+    "stroke": "Acute Ischemic Stroke",
+    "cerebrovascular": "Acute Ischemic Stroke",
+    "diabetes": "Type 2 Diabetes – Acute Complications",
+    "diabetic ketoacidosis": "Type 2 Diabetes – Acute Complications",
+    "dka": "Type 2 Diabetes – Acute Complications",
+    "hhs": "Type 2 Diabetes – Acute Complications",
+    "covid": "COVID-19",
+    "sars-cov": "COVID-19",
+}
+
+# One automaton pass over the parsed name replaces ~25 substring scans
+_KW_AUTOMATON = None
+if ahocorasick is not None:
+    _KW_AUTOMATON = ahocorasick.Automaton()
+    for _kw, _cond in KEYWORD_MAP.items():
+        _KW_AUTOMATON.add_word(_kw, _cond)
+    _KW_AUTOMATON.make_automaton()
+
+
+@functools.lru_cache(maxsize=512)
 def _match_condition_name(parsed_name: str) -> str | None:
     """
     Fuzzy-match a parsed condition name against CONDITION_SPECIALTY_MAP keys.
-    Uses exact → substring → keyword cascade.
+    Uses exact → substring → keyword cascade. Memoized: the same differential
+    text (and hence the same parsed name) recurs across reruns.
     """
     if not parsed_name:
         return None
 
     parsed_lower = parsed_name.lower()
 
-    # Exact match
-    for key in CONDITION_SPECIALTY_MAP:
-        if key.lower() == parsed_lower:
-            return key
+    # Exact match: single hash lookup
+    hit = _LOWER_TO_KEY.get(parsed_lower)
+    if hit is not None:
+        return hit
 
     # Substring match
-    for key in CONDITION_SPECIALTY_MAP:
-        key_lower = key.lower()
+    for key_lower, key in _KEYS_LOWER:
         if key_lower in parsed_lower or parsed_lower in key_lower:
             return key
 
-    # Keyword fallback
-    KEYWORD_MAP = {
-        "pneumonia": "Community-Acquired Pneumonia (CAP)",
-        "heart failure": "Acute Heart Failure / Decompensated Heart Failure",
-        "coronary": "Acute Coronary Syndrome (ACS)",
-        "acs": "Acute Coronary Syndrome (ACS)",
-        "myocardial infarction": "Acute Coronary Syndrome (ACS)",
-        "stemi": "Acute Coronary Syndrome (ACS)",
-        "nstemi": "Acute Coronary Syndrome (ACS)",
-        "copd": "COPD Exacerbation",
-        "chronic obstructive": "COPD Exacerbation",
-        "asthma": "Asthma Exacerbation",
-        "pulmonary embolism": "Pulmonary Embolism (PE)",
-        "embolism": "Pulmonary Embolism (PE)",
-        "sepsis": "Sepsis",
-        "septic": "Sepsis",
-        "stroke": "Acute Ischemic Stroke",
-        "cerebrovascular": "Acute Ischemic Stroke",
-        "diabetes": "Type 2 Diabetes \u2013 Acute Complications",
-        "diabetic ketoacidosis": "Type 2 Diabetes \u2013 Acute Complications",
-        "dka": "Type 2 Diabetes \u2013 Acute Complications",
-        "hhs": "Type 2 Diabetes \u2013 Acute Complications",
-        "covid": "COVID-19",
-        "sars-cov": "COVID-19",
-    }
+    # Keyword fallback: one automaton pass when pyahocorasick is available,
+    # otherwise the plain substring loop
+    if _KW_AUTOMATON is not None:
+        for _, condition in _KW_AUTOMATON.iter(parsed_lower):
+            return condition
+        return None
+
     for keyword, condition in KEYWORD_MAP.items():
         if keyword in parsed_lower:
             return condition
@@ -466,7 +813,7 @@ def recommend_hospitals(
 
     # 2. Look up specialty
     specialty_tags = None
-    if condition and condition in CONDITION_SPECIALTY_MAP:
+    if condition and condition in _CONDITION_KEYS:
         info = CONDITION_SPECIALTY_MAP[condition]
         result["condition"] = condition
         result["specialty"] = info["specialty"]
@@ -486,14 +833,226 @@ def recommend_hospitals(
         return result
 
     # 4. Sort: specialty matches first → emergency depts → distance
-    def sort_key(h):
-        return (
-            not h["specialty_match"],
-            not h["emergency"],
-            h["distance_km"],
+    result["hospitals"] = _sort_hospitals(hospitals)
+
+    return result
+
+
+def _sort_hospitals(hospitals: list[Hospital]) -> list[Hospital]:
+    """
+    Order facilities: specialty matches first, then emergency departments,
+    then by distance. One np.lexsort over three parallel arrays instead of
+    allocating a Python key tuple per hospital.
+    """
+    n = len(hospitals)
+    dists = np.fromiter((h.distance_km for h in hospitals),
+                        dtype=np.float64, count=n)
+    spec = np.fromiter((h.specialty_match for h in hospitals),
+                       dtype=bool, count=n)
+    emer = np.fromiter((h.emergency for h in hospitals),
+                       dtype=bool, count=n)
+    # lexsort keys run last-to-first: specialty_match is the primary key
+    order = np.lexsort((dists, ~emer, ~spec))
+    return [hospitals[i] for i in order]
+
+
+# ---------------------------------------------------------------------------
+# Async variants (aiohttp)
+# ---------------------------------------------------------------------------
+# The sync functions above block for the full round-trip of each API call;
+# these variants let callers overlap the geocoding and Overpass requests on
+# one pooled connection. They share the parsing helpers with the sync path
+# and require the optional aiohttp dependency.
+
+_AIOHTTP_SESSION = None
+_AIOHTTP_LOOP = None
+
+# Single-flight bookkeeping: cache key → (loop, future) of the in-flight
+# fetch; the loop is recorded because futures cannot be awaited from a
+# different event loop than the one that created them
+_INFLIGHT: dict[tuple, tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+
+
+def _get_aiohttp_session():
+    """
+    Lazily create a shared aiohttp session with a pooled connector.
+
+    Sessions are bound to the event loop that created them and their
+    `.closed` flag stays False after that loop ends, so a session left
+    over from a finished asyncio.run() must be replaced, not reused.
+    """
+    global _AIOHTTP_SESSION, _AIOHTTP_LOOP
+    if aiohttp is None:
+        raise RuntimeError("aiohttp is not installed; use the sync functions instead")
+    loop = asyncio.get_running_loop()
+    if (_AIOHTTP_SESSION is None or _AIOHTTP_SESSION.closed
+            or _AIOHTTP_LOOP is not loop):
+        _AIOHTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept-Encoding": "gzip, deflate, br",
+                "Accept": "application/json",
+            },
+        )
+        _AIOHTTP_LOOP = loop
+    return _AIOHTTP_SESSION
+
+
+async def ageocode_address(address: str) -> tuple[float, float] | None:
+    """Async variant of geocode_address()."""
+    cache_key = ("nominatim", _normalize_query(address))
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return tuple(cached)
+
+    params = {"q": address, "format": "json", "limit": 1}
+    # Session acquisition stays outside the try: a missing aiohttp or a
+    # loop-affinity bug should surface, not read as a failed lookup
+    session = _get_aiohttp_session()
+    try:
+        async with session.get(
+            NOMINATIM_URL, params=params,
+            timeout=aiohttp.ClientTimeout(total=10),
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        if data:
+            coords = (float(data[0]["lat"]), float(data[0]["lon"]))
+            _cache_put(cache_key, coords, GEOCODE_CACHE_TTL)
+            return coords
+        return None
+    except (aiohttp.ClientError, KeyError, IndexError, ValueError):
+        return None
+
+
+async def afetch_location_suggestions(query: str, limit: int = 5) -> list[dict]:
+    """
+    Async variant of fetch_location_suggestions().
+
+    Identical queries issued while a fetch is already in flight (rapid
+    keystrokes, race-y re-renders) await the first request's future instead
+    of hitting Photon N times.
+    """
+    if not query or len(query.strip()) < 3:
+        return []
+
+    cache_key = ("photon", _normalize_query(query), limit)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    inflight = _INFLIGHT.get(cache_key)
+    # Only join an in-flight fetch from the same loop — futures cannot be
+    # awaited across loops, and an entry from a finished asyncio.run() is
+    # dead anyway
+    if inflight is not None and inflight[0] is loop:
+        return await asyncio.shield(inflight[1])
+
+    future: asyncio.Future = loop.create_future()
+    _INFLIGHT[cache_key] = (loop, future)
+    try:
+        suggestions = await _afetch_photon(query, limit)
+        future.set_result(suggestions)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        entry = _INFLIGHT.get(cache_key)
+        if entry is not None and entry[1] is future:
+            _INFLIGHT.pop(cache_key, None)
+
+    if suggestions:
+        _cache_put(cache_key, suggestions, SUGGEST_CACHE_TTL)
+    return suggestions
+
+
+async def _afetch_photon(query: str, limit: int) -> list[dict]:
+    """Perform the actual Photon request for afetch_location_suggestions()."""
+    params = {"q": query.strip(), "limit": limit}
+    session = _get_aiohttp_session()
+    try:
+        async with session.get(
+            PHOTON_URL, params=params,
+            timeout=aiohttp.ClientTimeout(total=5),
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    except (aiohttp.ClientError, ValueError):
+        return []
+
+    return _parse_photon_response(data)
+
+
+async def aget_nearby_hospitals(
+    lat: float,
+    lon: float,
+    radius_km: float = 10,
+    specialty_tags: dict | None = None,
+) -> list[Hospital]:
+    """Async variant of get_nearby_hospitals()."""
+    cache_key = ("overpass", round(lat, 3), round(lon, 3), int(radius_km * 1000))
+    data = _cache_get(cache_key)
+
+    if data is None:
+        query = _build_overpass_query(lat, lon, radius_km)
+        session = _get_aiohttp_session()
+        try:
+            async with session.post(
+                OVERPASS_URL, data={"data": query},
+                timeout=aiohttp.ClientTimeout(total=30),
+            ) as resp:
+                resp.raise_for_status()
+                if orjson is not None:
+                    data = orjson.loads(await resp.read())
+                else:
+                    data = await resp.json()
+        except (aiohttp.ClientError, ValueError):
+            return []
+        _cache_put(cache_key, data, OVERPASS_CACHE_TTL)
+
+    return _parse_overpass_response(data, lat, lon, specialty_tags, radius_km)
+
+
+async def arecommend_hospitals(
+    differential_text: str,
+    lat: float,
+    lon: float,
+    radius_km: float = 10,
+) -> dict:
+    """Async variant of recommend_hospitals(), built on aget_nearby_hospitals()."""
+    result: dict[str, Any] = {
+        "condition": None,
+        "specialty": "General Medicine",
+        "urgency": "Routine",
+        "user_location": (lat, lon),
+        "hospitals": [],
+        "error": None,
+    }
+
+    parsed = _parse_top_condition(differential_text)
+    condition = _match_condition_name(parsed) if parsed else None
+
+    specialty_tags = None
+    if condition and condition in _CONDITION_KEYS:
+        info = CONDITION_SPECIALTY_MAP[condition]
+        result["condition"] = condition
+        result["specialty"] = info["specialty"]
+        result["urgency"] = info["urgency"]
+        specialty_tags = info["osm_tags"]
+    else:
+        result["condition"] = parsed or "Unknown"
+
+    hospitals = await aget_nearby_hospitals(lat, lon, radius_km, specialty_tags)
+
+    if not hospitals:
+        result["error"] = (
+            f"No hospitals or clinics found within {radius_km} km. "
+            "Try increasing the search radius or entering a different location."
         )
+        return result
 
-    hospitals.sort(key=sort_key)
-    result["hospitals"] = hospitals
+    result["hospitals"] = _sort_hospitals(hospitals)
 
     return result
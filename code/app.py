@@ -6,6 +6,7 @@ Multi-agent clinical decision support system.
 import os
 import sys
 import json
+import threading
 import time
 
 import streamlit as st
@@ -13,9 +14,125 @@ import streamlit as st
 # Ensure project root is on the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from data.corpus import chunk_corpus, build_faiss_index
+# BLAS/OMP read these at import time, so set them before torch/faiss are
+# first imported (both load lazily further down). Streamlit subprocesses
+# otherwise often leave the numeric stack single-threaded on CPU hosts.
+_N_CPUS = os.cpu_count() or 1
+os.environ.setdefault("OMP_NUM_THREADS", str(_N_CPUS))
+os.environ.setdefault("MKL_NUM_THREADS", str(_N_CPUS))
+
+
+def _apply_thread_count(n: int) -> None:
+    """Point torch and faiss at `n` CPU threads (no-op for missing libs)."""
+    try:
+        import torch
+        torch.set_num_threads(n)
+    except ImportError:
+        pass
+    try:
+        import faiss
+        faiss.omp_set_num_threads(n)
+    except (ImportError, AttributeError):
+        pass
+
+from data.corpus import build_or_load_index
+from encoder import load_encoder
+from agents.agents import prewarm_query_vector
 from orchestrator import run_healthguard
-from agents.hospital_finder import recommend_hospitals, geocode_address, fetch_location_suggestions
+from agents.hospital_finder import (
+    recommend_hospitals,
+    geocode_address,
+    fetch_location_suggestions,
+    _parse_top_condition,
+)
+
+
+# Cached fronts for the geocoders: identical queries across reruns (and
+# across sessions on the same server) skip the network entirely.
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def cached_location_suggestions(query: str, limit: int = 5) -> list[dict]:
+    return fetch_location_suggestions(query, limit=limit)
+
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def cached_geocode_address(address: str):
+    return geocode_address(address)
+
+
+# Keyed on (top condition, ~100 m coordinate bucket, radius) rather than the
+# full differential text and raw floats, so GPS jitter or a re-phrased
+# differential with the same top diagnosis reuses the OSM results. The
+# underscore excludes the markdown blob from the cache key.
+@st.cache_data(ttl=600, max_entries=128, show_spinner=False)
+def cached_recommend_hospitals(top_condition, lat: float, lon: float,
+                               radius_km: float, _differential_text: str):
+    return recommend_hospitals(
+        differential_text=_differential_text,
+        lat=lat, lon=lon, radius_km=radius_km,
+    )
+
+
+def _hospitals_frame(hospitals):
+    """
+    Column-oriented view of the ranked hospital records. Ranking order
+    from recommend_hospitals is preserved; the marker color is assigned
+    once, vectorized, instead of per-hospital on every rerun.
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame(hospitals)
+    df["color"] = np.where(
+        df["specialty_match"], "green",
+        np.where(df["emergency"], "red", "gray"),
+    )
+    df["color_rgb"] = df["color"].map({
+        "green": [39, 174, 96],
+        "red": [231, 76, 60],
+        "gray": [127, 140, 141],
+    })
+    return df
+
+
+def _hospital_deck(user_lat: float, user_lon: float, df):
+    """
+    WebGL hospital map: deck.gl scatter layers render in the browser's
+    GPU with no per-marker HTML generation on the Python side (folium
+    builds a Leaflet DOM element per marker).
+    """
+    import pandas as pd
+    import pydeck as pdk
+
+    hospital_layer = pdk.Layer(
+        "ScatterplotLayer",
+        df.head(15)[["name", "lat", "lon", "type", "distance_km",
+                     "color_rgb"]],
+        get_position=["lon", "lat"],
+        get_fill_color="color_rgb",
+        get_radius=250,
+        radius_min_pixels=6,
+        pickable=True,
+    )
+    user_layer = pdk.Layer(
+        "ScatterplotLayer",
+        pd.DataFrame([{
+            "name": "Your Location", "lat": user_lat, "lon": user_lon,
+            "type": "", "distance_km": 0.0,
+        }]),
+        get_position=["lon", "lat"],
+        get_fill_color=[41, 128, 185],
+        get_radius=250,
+        radius_min_pixels=8,
+        pickable=True,
+    )
+    return pdk.Deck(
+        layers=[hospital_layer, user_layer],
+        initial_view_state=pdk.ViewState(
+            latitude=user_lat, longitude=user_lon, zoom=11
+        ),
+        tooltip={"html": "<b>{name}</b><br/>{type} — {distance_km} km"},
+        map_style=None,
+    )
 
 try:
     from streamlit_js_eval import streamlit_js_eval
@@ -36,90 +153,16 @@ st.set_page_config(
 # ---------------------------------------------------------------------------
 # Custom CSS
 # ---------------------------------------------------------------------------
-st.markdown("""
-<style>
-    /* Main header */
-    .main-header {
-        background: linear-gradient(135deg, #1a5276 0%, #2e86c1 100%);
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        color: white;
-        margin-bottom: 1.5rem;
-    }
-    .main-header h1 { color: white; margin: 0; font-size: 2rem; }
-    .main-header p { color: #d5e8f0; margin: 0.3rem 0 0 0; font-size: 0.95rem; }
-
-    /* Agent step cards */
-    .agent-card {
-        background: #f8f9fa;
-        border-left: 4px solid #2e86c1;
-        padding: 0.8rem 1rem;
-        border-radius: 0 8px 8px 0;
-        margin-bottom: 0.6rem;
-    }
-    .agent-card.active {
-        border-left-color: #f39c12;
-        background: #fef9e7;
-    }
-    .agent-card.done {
-        border-left-color: #27ae60;
-        background: #eafaf1;
-    }
-
-    /* Disclaimer */
-    .disclaimer {
-        background: #fdedec;
-        border: 1px solid #e74c3c;
-        border-radius: 8px;
-        padding: 0.8rem 1rem;
-        font-size: 0.85rem;
-        color: #922b21;
-        margin-bottom: 1rem;
-    }
-
-    /* Metric cards */
-    .metric-row {
-        display: flex;
-        gap: 0.8rem;
-        margin-bottom: 1rem;
-    }
-    .metric-box {
-        background: #eaf2f8;
-        border-radius: 8px;
-        padding: 0.6rem 1rem;
-        flex: 1;
-        text-align: center;
-    }
-    .metric-box .label { font-size: 0.75rem; color: #5d6d7e; text-transform: uppercase; }
-    .metric-box .value { font-size: 1.4rem; font-weight: 700; color: #1a5276; }
-
-    /* Hide default streamlit footer */
-    footer { visibility: hidden; }
-
-    /* Hospital recommendation section */
-    .hospital-header {
-        background: linear-gradient(135deg, #1a8754 0%, #27ae60 100%);
-        padding: 1rem 1.2rem;
-        border-radius: 10px;
-        color: white;
-        margin: 1.2rem 0 0.8rem 0;
-    }
-    .hospital-header h3 { color: white; margin: 0; font-size: 1.2rem; }
-    .hospital-header p { color: #d5f5e3; margin: 0.2rem 0 0 0; font-size: 0.85rem; }
-
-    .urgency-badge {
-        display: inline-block;
-        padding: 0.2rem 0.6rem;
-        border-radius: 12px;
-        font-size: 0.8rem;
-        font-weight: 600;
-        margin-left: 0.5rem;
-    }
-    .urgency-emergency { background: #e74c3c; color: white; }
-    .urgency-urgent { background: #f39c12; color: white; }
-    .urgency-routine { background: #2ecc71; color: white; }
-</style>
-""", unsafe_allow_html=True)
+_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+
+@st.cache_data(show_spinner=False)
+def _css() -> str:
+    with open(os.path.join(_STATIC_DIR, "styles.css")) as f:
+        return f"<style>{f.read()}</style>"
+
+
+st.markdown(_css(), unsafe_allow_html=True)
 
 
 # ---------------------------------------------------------------------------
@@ -158,6 +201,15 @@ with st.sidebar:
 
     top_k = st.slider("Literature chunks to retrieve", 3, 15, 8)
 
+    if _N_CPUS > 1:
+        cpu_threads = st.slider(
+            "CPU threads (encoder + search)", 1, _N_CPUS, _N_CPUS,
+            help="Threads used by PyTorch and FAISS. Lower this on shared "
+                 "or memory-constrained hosts.",
+        )
+    else:
+        cpu_threads = 1
+
     st.divider()
     st.header("Architecture")
     st.markdown("""
@@ -205,7 +257,12 @@ with st.sidebar:
 
     current_query = location_query.strip()
     if current_query and len(current_query) >= 3 and current_query != st.session_state.loc_query_last:
-        st.session_state.loc_suggestions = fetch_location_suggestions(current_query, limit=5)
+        # Always fetch for the last observed query: Streamlit only reruns
+        # on widget events, so skipping here (e.g. a time debounce) would
+        # leave the final keystroke's suggestions unfetched forever. The
+        # st.cache_data front absorbs repeat lookups, so intermediate
+        # prefixes cost one network call each at most.
+        st.session_state.loc_suggestions = cached_location_suggestions(current_query, limit=5)
         st.session_state.loc_query_last = current_query
         st.session_state.loc_selected_label = None
         st.session_state.user_lat = None
@@ -247,7 +304,7 @@ with st.sidebar:
                 )
     elif current_query and len(current_query) >= 3:
         st.warning("No suggestions found. Trying direct geocoding...")
-        coords = geocode_address(current_query)
+        coords = cached_geocode_address(current_query)
         if coords:
             st.session_state.user_lat, st.session_state.user_lon = coords
             st.session_state.location_source = "address"
@@ -261,21 +318,69 @@ with st.sidebar:
 # ---------------------------------------------------------------------------
 # Load / cache the embedding model and index
 # ---------------------------------------------------------------------------
+def _cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
 @st.cache_resource(show_spinner="Loading embedding model (first run only)...")
 def load_model():
-    from sentence_transformers import SentenceTransformer
-    return SentenceTransformer("all-MiniLM-L6-v2")
+    # Uses the int8 ONNX export when one exists (HEALTHGUARD_ONNX_DIR,
+    # produced by encoder.export_quantized_onnx) — ~3-4x faster CPU encoding
+    # of the clinical note — and falls back to the FP32 SentenceTransformer.
+    # With CUDA present, the PyTorch encoder runs on the GPU instead.
+    # load_encoder defers the heavy torch/transformers imports until here,
+    # inside this spinnered cached call, so the UI paints first.
+    enc = load_encoder(device="cuda" if _cuda_available() else None)
+
+    # Opt-in: compile the transformer to strip per-op Python dispatch,
+    # the dominant cost for a model as small as MiniLM on warm encodes.
+    # Off by default because the first encode then pays a multi-second
+    # compile (reusable across runs via TORCH_COMPILE_CACHE_DIR).
+    if (os.environ.get("HEALTHGUARD_TORCH_COMPILE", "") == "1"
+            and hasattr(enc, "_first_module")):
+        try:
+            import torch
+            enc[0].auto_model = torch.compile(
+                enc[0].auto_model, mode="reduce-overhead", fullgraph=False
+            )
+        except Exception:
+            pass  # older torch or unsupported backend – keep eager
+    return enc
+
+
+# "auto" keeps the exact flat index for the built-in mini-corpus and moves
+# to ANN (hnsw/ivf) as the corpus grows; override for a larger local corpus.
+INDEX_TYPE = os.environ.get("HEALTHGUARD_INDEX_TYPE", "auto")
 
 
 @st.cache_resource(show_spinner="Building medical literature index...")
 def load_index(_model):
-    chunks = chunk_corpus(chunk_size=500, chunk_overlap=100)
-    index, chunk_list, _ = build_faiss_index(chunks, _model)
-    return index, chunk_list
+    # Embeddings and index are persisted keyed on corpus/model/chunking, so
+    # cold starts mmap the cached artifacts instead of re-encoding the corpus
+    index, chunk_list, _ = build_or_load_index(
+        _model, chunk_size=500, chunk_overlap=100, index_type=INDEX_TYPE
+    )
+    # Move search to the GPU when a CUDA faiss build is present; the
+    # resources object must stay referenced as long as the index lives,
+    # and this function is a cached resource, so returning it suffices.
+    import faiss
+    if getattr(faiss, "get_num_gpus", lambda: 0)() > 0:
+        try:
+            gpu_res = faiss.StandardGpuResources()
+            index = faiss.index_cpu_to_gpu(gpu_res, 0, index)
+            return index, chunk_list, gpu_res
+        except Exception:
+            pass
+    return index, chunk_list, None
 
 
 model = load_model()
-faiss_index, chunk_list = load_index(model)
+faiss_index, chunk_list, _gpu_res = load_index(model)
+_apply_thread_count(cpu_threads)
 
 
 # ---------------------------------------------------------------------------
@@ -333,6 +438,14 @@ with col_input:
     example = st.selectbox("Quick examples", list(EXAMPLES.keys()))
     default_text = EXAMPLES.get(example, "")
 
+    # Pre-encode the selected vignette's retrieval query in the background
+    # so the first "Analyze" click hits a warm embedding cache.
+    if default_text and st.session_state.get("prewarmed_example") != example:
+        st.session_state.prewarmed_example = example
+        threading.Thread(
+            target=prewarm_query_vector, args=(default_text, model), daemon=True
+        ).start()
+
     notes = st.text_area(
         "Enter clinical notes",
         value=default_text,
@@ -349,7 +462,15 @@ with col_input:
 with col_output:
     st.subheader("Diagnostic Output")
 
-    if run_btn and notes.strip():
+    # Re-clicking Analyze with identical inputs (common when users tweak
+    # the radius and click again) should not re-run extraction/retrieval/LLM.
+    # Only a successful run counts — a transient failure (LLM/network error
+    # captured in result.error) must not stick; re-clicking retries it.
+    notes_key = (notes, top_k)
+    _prev = st.session_state.get("pipeline_result")
+    if (run_btn and notes.strip()
+            and (st.session_state.get("pipeline_key") != notes_key
+                 or _prev is None or _prev.error is not None)):
         # Progress indicators
         status_container = st.container()
 
@@ -362,9 +483,17 @@ with col_output:
                 top_k=top_k,
             )
 
-        # Store result in session state so it survives reruns
+        # Store result in session state so it survives reruns, along with a
+        # one-pass metrics snapshot so reruns don't rescan findings/timings
         st.session_state.pipeline_result = result
         st.session_state.pipeline_notes = notes
+        st.session_state.pipeline_key = notes_key
+        st.session_state.pipeline_summary = {
+            "n_findings": len(result.findings),
+            "n_chunks": len(result.literature),
+            "valid": result.validation.get("valid", False),
+            "total_s": sum(result.timings.values()),
+        }
 
     # Display results from session state (persists across reruns)
     result = st.session_state.get("pipeline_result")
@@ -372,25 +501,25 @@ with col_output:
     if result and result.error:
         st.error(result.error)
     elif result:
-        # Timing metrics
-        total_time = sum(result.timings.values())
+        # Timing metrics (from the snapshot computed once per pipeline run)
+        summary = st.session_state.pipeline_summary
         st.markdown(f"""
         <div class="metric-row">
             <div class="metric-box">
                 <div class="label">Findings</div>
-                <div class="value">{len(result.findings)}</div>
+                <div class="value">{summary["n_findings"]}</div>
             </div>
             <div class="metric-box">
                 <div class="label">Chunks Retrieved</div>
-                <div class="value">{len(result.literature)}</div>
+                <div class="value">{summary["n_chunks"]}</div>
             </div>
             <div class="metric-box">
                 <div class="label">Citations Valid</div>
-                <div class="value">{"Yes" if result.validation.get("valid", False) else "Review"}</div>
+                <div class="value">{"Yes" if summary["valid"] else "Review"}</div>
             </div>
             <div class="metric-box">
                 <div class="label">Total Time</div>
-                <div class="value">{total_time:.1f}s</div>
+                <div class="value">{summary["total_s"]:.1f}s</div>
             </div>
         </div>
         """, unsafe_allow_html=True)
@@ -411,15 +540,16 @@ with col_output:
                 ctx = f"  \n*Context:* {f['context']}" if f.get("context") else ""
                 st.markdown(f"- **{f['finding']}**{val}{ctx}")
 
-        # Retrieved literature
+        # Retrieved literature (one markdown element for the whole list —
+        # per-chunk elements triple Streamlit's diffing work)
         with st.expander("Retrieved Literature Chunks", expanded=False):
-            for i, chunk in enumerate(result.literature, 1):
-                score = chunk.get("relevance_score", 0)
-                st.markdown(f"**{i}. [{chunk['title']}]({chunk['url']})**  \n"
-                            f"*Chunk ID:* `{chunk['chunk_id']}` | "
-                            f"*Relevance:* {score:.3f}")
-                st.markdown(f"> {chunk['text'][:400]}...")
-                st.divider()
+            st.markdown("\n\n---\n\n".join(
+                f"**{i}. [{chunk['title']}]({chunk['url']})**  \n"
+                f"*Chunk ID:* `{chunk['chunk_id']}` | "
+                f"*Relevance:* {chunk.get('relevance_score', 0):.3f}\n\n"
+                f"> {chunk['text'][:400]}..."
+                for i, chunk in enumerate(result.literature, 1)
+            ))
 
         # Pipeline timing
         with st.expander("Pipeline Timing", expanded=False):
@@ -481,22 +611,27 @@ with col_output:
                 f"{st.session_state.user_lon:.4f})"
             )
 
-            # Cache hospital results in session state to avoid re-querying on reruns
+            # Cache hospital results in session state to avoid re-querying
+            # on reruns; coordinates are rounded to ~100 m so GPS jitter
+            # does not invalidate the key
+            rec_key = (
+                _parse_top_condition(result.differential),
+                round(st.session_state.user_lat, 3),
+                round(st.session_state.user_lon, 3),
+                hospital_radius,
+            )
             if ("hospital_rec" not in st.session_state
-                    or st.session_state.get("hospital_rec_key") != (
-                        result.differential, st.session_state.user_lat,
-                        st.session_state.user_lon, hospital_radius)):
+                    or st.session_state.get("hospital_rec_key") != rec_key):
                 with st.spinner("Searching for nearby hospitals..."):
-                    rec = recommend_hospitals(
-                        differential_text=result.differential,
-                        lat=st.session_state.user_lat,
-                        lon=st.session_state.user_lon,
-                        radius_km=hospital_radius,
+                    rec = cached_recommend_hospitals(
+                        *rec_key, result.differential
                     )
                 st.session_state.hospital_rec = rec
-                st.session_state.hospital_rec_key = (
-                    result.differential, st.session_state.user_lat,
-                    st.session_state.user_lon, hospital_radius)
+                st.session_state.hospital_df = (
+                    _hospitals_frame(rec["hospitals"])
+                    if rec["hospitals"] else None
+                )
+                st.session_state.hospital_rec_key = rec_key
             else:
                 rec = st.session_state.hospital_rec
 
@@ -514,82 +649,28 @@ with col_output:
             if rec["error"]:
                 st.warning(rec["error"])
             elif rec["hospitals"]:
-                # Interactive map
+                df = st.session_state.hospital_df
+                # Interactive map (GPU-rendered in the browser via deck.gl)
                 try:
-                    import folium
-                    from streamlit_folium import st_folium
-
-                    m = folium.Map(
-                        location=[
-                            st.session_state.user_lat,
-                            st.session_state.user_lon,
-                        ],
-                        zoom_start=12,
-                    )
-
-                    # User marker
-                    folium.Marker(
-                        [st.session_state.user_lat,
-                         st.session_state.user_lon],
-                        popup="Your Location",
-                        icon=folium.Icon(
-                            color="blue", icon="user", prefix="fa"
-                        ),
-                    ).add_to(m)
-
-                    # Hospital markers
-                    for h in rec["hospitals"][:15]:
-                        if h["specialty_match"]:
-                            color = "green"
-                        elif h["emergency"]:
-                            color = "red"
-                        else:
-                            color = "gray"
-
-                        popup_parts = [f"<b>{h['name']}</b>"]
-                        popup_parts.append(
-                            f"Type: {h['type']} | "
-                            f"{h['distance_km']} km"
-                        )
-                        if h["phone"]:
-                            popup_parts.append(f"Phone: {h['phone']}")
-                        if h["specialty"]:
-                            popup_parts.append(
-                                f"Specialty: {h['specialty']}"
-                            )
-                        popup_html = "<br>".join(popup_parts)
-
-                        folium.Marker(
-                            [h["lat"], h["lon"]],
-                            popup=folium.Popup(
-                                popup_html, max_width=250
-                            ),
-                            icon=folium.Icon(
-                                color=color,
-                                icon="plus-square",
-                                prefix="fa",
-                            ),
-                        ).add_to(m)
-
-                    # returned_objects=[] prevents map clicks from triggering reruns
-                    st_folium(m, width=700, height=400, returned_objects=[])
-
+                    st.pydeck_chart(_hospital_deck(
+                        st.session_state.user_lat,
+                        st.session_state.user_lon,
+                        df,
+                    ))
                 except ImportError:
-                    # Fallback to st.map if folium not installed
-                    import pandas as pd
-                    map_data = pd.DataFrame([
-                        {"lat": h["lat"], "lon": h["lon"]}
-                        for h in rec["hospitals"][:15]
-                    ])
-                    st.map(map_data)
-
-                # Hospital details list
+                    # Fallback to st.map if pydeck not installed
+                    st.map(df.head(15)[["lat", "lon"]])
+
+                # Hospital details list, emitted as a single markdown
+                # element with --- separators instead of one element
+                # (plus st.divider) per hospital
                 st.markdown("**Nearby Facilities:**")
-                for i, h in enumerate(rec["hospitals"][:10], 1):
+                entries = []
+                for i, h in enumerate(df.head(10).itertuples(), 1):
                     tags = []
-                    if h["specialty_match"]:
+                    if h.specialty_match:
                         tags.append("Specialty Match")
-                    if h["emergency"]:
+                    if h.emergency:
                         tags.append("Emergency Dept")
                     tag_str = (
                         " &mdash; " + ", ".join(f"**{t}**" for t in tags)
@@ -597,19 +678,18 @@ with col_output:
                     )
 
                     details = (
-                        f"**{i}. {h['name']}**{tag_str}  \n"
-                        f"{h['distance_km']} km away | {h['type']}"
+                        f"**{i}. {h.name}**{tag_str}  \n"
+                        f"{h.distance_km} km away | {h.type}"
                     )
-                    if h["address"]:
-                        details += f"  \nAddress: {h['address']}"
-                    if h["phone"]:
-                        details += f"  \nPhone: {h['phone']}"
-                    if h["website"]:
-                        details += f"  \n[Website]({h['website']})"
-
-                    st.markdown(details)
-                    if i < min(len(rec["hospitals"]), 10):
-                        st.divider()
+                    if h.address:
+                        details += f"  \nAddress: {h.address}"
+                    if h.phone:
+                        details += f"  \nPhone: {h.phone}"
+                    if h.website:
+                        details += f"  \n[Website]({h.website})"
+                    entries.append(details)
+
+                st.markdown("\n\n---\n\n".join(entries))
         else:
             st.info(
                 "Location not available. Enter your address in the "
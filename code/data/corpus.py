@@ -4,11 +4,39 @@ Downloads/stores medical review article texts, chunks them,
 generates embeddings, and builds a FAISS index.
 """
 
+from __future__ import annotations
+
+import concurrent.futures
+import functools
+import hashlib
 import json
+import multiprocessing
 import os
+import pickle
+import sqlite3
+import sys
 import numpy as np
-import faiss
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+@functools.lru_cache(maxsize=1)
+def _faiss():
+    """
+    Import faiss on first use. The shared library costs a few hundred ms
+    to load, which scripts that only want get_corpus()/chunk_corpus()
+    (pure Python) shouldn't pay; langchain's splitter is deferred the
+    same way inside _split_article.
+    """
+    import faiss
+
+    # Containers frequently cap the OpenMP default at one thread, starving
+    # FAISS index builds and batched searches. The Streamlit app re-applies
+    # its own (user-adjustable) count after loading, so this is only the
+    # baseline for scripted/CLI use.
+    try:
+        faiss.omp_set_num_threads(os.cpu_count() or 1)
+    except AttributeError:
+        pass  # stripped-down faiss build
+    return faiss
 
 # ---------------------------------------------------------------------------
 # Built-in mini-corpus: 10 synthetic review-article summaries covering common
@@ -183,65 +211,488 @@ def get_corpus():
     return ARTICLES
 
 
-def chunk_corpus(articles=None, chunk_size=500, chunk_overlap=100):
+# Shared directory for derived corpus artifacts (chunk lists, per-text
+# embedding stores, and the whole-index cache in build_or_load_index).
+EMB_CACHE_DIR = "data/index_cache"
+
+
+# Below this many articles, splitting runs serially: process startup and
+# article pickling would dwarf the pure-Python split work.
+PARALLEL_SPLIT_THRESHOLD = 32
+
+
+def _intern_chunk_meta(chunks):
     """
-    Chunk articles into overlapping segments suitable for embedding.
-    Returns list of dicts: {chunk_id, text, article_id, title, url, chunk_index}
+    Intern the per-article strings every chunk carries (article_id,
+    title, url): dozens of chunks share each value, and deserialized
+    copies would otherwise each hold their own allocation. Keeps the
+    flat chunk schema the retrieval agents and UI index into.
     """
-    if articles is None:
-        articles = get_corpus()
+    for chunk in chunks:
+        chunk["article_id"] = sys.intern(chunk["article_id"])
+        chunk["title"] = sys.intern(chunk["title"])
+        chunk["url"] = sys.intern(chunk["url"])
+    return chunks
 
+
+def _split_article(job):
+    """Split one article into chunk dicts (top-level so pools can pickle it)."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    article, chunk_size, chunk_overlap = job
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len,
         separators=["\n\n", "\n", ". ", " ", ""],
     )
+    return [
+        {
+            "chunk_id": f"{article['id']}_chunk_{i}",
+            "text": text,
+            "article_id": article["id"],
+            "title": article["title"],
+            "url": article["url"],
+            "chunk_index": i,
+        }
+        for i, text in enumerate(splitter.split_text(article["text"].strip()))
+    ]
+
+
+def chunk_corpus(articles=None, chunk_size=500, chunk_overlap=100,
+                 cache_dir=EMB_CACHE_DIR):
+    """
+    Chunk articles into overlapping segments suitable for embedding.
+    Returns list of dicts: {chunk_id, text, article_id, title, url, chunk_index}
+
+    Splitting is deterministic in (articles, chunk_size, chunk_overlap),
+    so the output is cached on disk keyed by their hash; repeated starts
+    read the chunk list instead of re-running the splitter.
+    """
+    if articles is None:
+        articles = get_corpus()
 
-    chunks = []
+    h = hashlib.sha256()
     for article in articles:
-        splits = splitter.split_text(article["text"].strip())
-        for i, text in enumerate(splits):
-            chunks.append({
-                "chunk_id": f"{article['id']}_chunk_{i}",
-                "text": text,
-                "article_id": article["id"],
-                "title": article["title"],
-                "url": article["url"],
-                "chunk_index": i,
-            })
+        h.update(article["text"].encode("utf-8"))
+    h.update(f"|{chunk_size}|{chunk_overlap}".encode())
+    cache_path = os.path.join(cache_dir, f"chunks_{h.hexdigest()[:16]}.json")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                return _intern_chunk_meta(json.load(f))
+        except (OSError, ValueError):
+            pass  # unreadable/corrupt cache – fall through and rebuild
+
+    # Splitting is pure-Python with no GIL release, so large corpora are
+    # split across processes; the handful of built-in articles stay
+    # serial since worker spawn would cost more than it saves.
+    jobs = [(article, chunk_size, chunk_overlap) for article in articles]
+    if len(articles) >= PARALLEL_SPLIT_THRESHOLD:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count()
+        ) as pool:
+            per_article = list(pool.map(_split_article, jobs))
+    else:
+        per_article = [_split_article(job) for job in jobs]
+    chunks = _intern_chunk_meta(
+        [chunk for article_chunks in per_article
+         for chunk in article_chunks]
+    )
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(chunks, f)
+    except OSError:
+        pass  # read-only deployment – serve from memory
     return chunks
 
 
-def build_faiss_index(chunks, model):
+# Exact (flat) search is cheapest for the built-in mini-corpus; above this
+# many chunks, brute-force O(N·D) per query starts to dominate and a
+# graph-based ANN index (HNSW) gives sub-linear search at recall ≥0.95.
+HNSW_CHUNK_THRESHOLD = 10_000
+
+@functools.lru_cache(maxsize=4)
+def get_embedder(model_name="all-MiniLM-L6-v2"):
+    """
+    Process-wide encoder factory: one instance per model name (weights
+    are 100+ MB, so accidental re-instantiation is costly). The instance
+    is warmed with a throwaway encode so lazy kernel/CUDA initialization
+    happens here rather than on the first real query.
+    """
+    from encoder import load_encoder
+
+    try:
+        import torch
+        device = "cuda" if torch.cuda.is_available() else None
+    except ImportError:
+        device = None
+
+    model = load_encoder(model_name, device=device)
+    model.encode(["warmup"])
+    return model
+
+
+def _model_hub_name(model):
+    """Name identifying the encoder's embedding space: the `_hub_name`
+    the encoder.py wrappers carry, else the underlying transformer's hub
+    path, else None."""
+    name = getattr(model, "_hub_name", None)
+    if name:
+        return name
+    try:
+        return model._first_module().auto_model.config._name_or_path
+    except Exception:
+        return None
+
+
+def _model_signature(model):
+    """Short hash identifying the encoder, so a model swap invalidates
+    its embedding store."""
+    name = _model_hub_name(model) or type(model).__name__
+    return hashlib.blake2b(str(name).encode(), digest_size=8).hexdigest()
+
+
+# Below this many cache misses, one encoder saturates the win: PyTorch
+# intra-op parallelism flattens out around 8 threads for MiniLM, so extra
+# cores only pay off once there is enough text to shard across processes.
+PARALLEL_EMBED_THRESHOLD = 1_000
+
+_WORKER_MODEL = None
+
+
+def _init_embed_worker(model_name, threads):
+    """Give each embedding worker its own encoder (top-level so spawn can
+    pickle it); threads are split so workers don't oversubscribe cores."""
+    global _WORKER_MODEL
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from encoder import load_encoder
+    _WORKER_MODEL = load_encoder(model_name)
+
+
+def _encode_shard(texts):
+    return _WORKER_MODEL.encode(
+        texts, batch_size=64, convert_to_numpy=True,
+        normalize_embeddings=True, show_progress_bar=False,
+    ).astype("float32", copy=False)
+
+
+def _encode_parallel(texts, model_name):
+    """Shard `texts` across spawn workers that each hold their own
+    encoder, and concatenate the shard matrices in input order."""
+    n_cpus = os.cpu_count() or 2
+    n_workers = max(2, min(8, n_cpus // 2))
+    shard = -(-len(texts) // n_workers)
+    shards = [texts[i:i + shard] for i in range(0, len(texts), shard)]
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(
+        len(shards), initializer=_init_embed_worker,
+        initargs=(model_name, max(1, n_cpus // len(shards))),
+    ) as pool:
+        return np.concatenate(pool.map(_encode_shard, shards), axis=0)
+
+
+def _embed_texts_cached(texts, model, cache_dir=EMB_CACHE_DIR):
+    """
+    Encode texts through an on-disk per-text vector store keyed by
+    blake2b(text) under a per-model .npz file. Only cache misses hit the
+    transformer; the returned matrix follows the input order.
+    """
+    path = os.path.join(cache_dir, f"emb_{_model_signature(model)}.npz")
+    store = {}
+    if os.path.exists(path):
+        try:
+            with np.load(path) as z:
+                store = {k: z[k] for k in z.files}
+        except Exception:
+            store = {}
+
+    keys = [hashlib.blake2b(t.encode("utf-8"), digest_size=16).hexdigest()
+            for t in texts]
+    miss_idx = [i for i, k in enumerate(keys) if k not in store]
+
+    if miss_idx:
+        miss_texts = [texts[i] for i in miss_idx]
+        encoded = None
+        # Cold builds with many misses shard across processes; each
+        # worker loads its own encoder, so this only pays off past the
+        # threshold and needs a re-loadable hub name.
+        model_name = _model_hub_name(model)
+        if len(miss_texts) >= PARALLEL_EMBED_THRESHOLD and model_name:
+            try:
+                encoded = _encode_parallel(miss_texts, model_name)
+            except Exception:
+                encoded = None  # no spawn support here – serial below
+        if encoded is None:
+            encoded = model.encode(
+                miss_texts,
+                batch_size=128,
+                show_progress_bar=True,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+        encoded = np.ascontiguousarray(encoded, dtype="float32")
+        for row, i in enumerate(miss_idx):
+            store[keys[i]] = encoded[row]
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, **store)
+        except OSError:
+            pass  # read-only deployment – in-memory result still valid
+
+    return np.stack([store[k] for k in keys]).astype("float32", copy=False)
+
+
+def build_faiss_index(chunks, model, index_type="auto", quantize=False,
+                      precision="float32"):
     """
     Build a FAISS index from chunk embeddings.
     `model` should be a SentenceTransformer instance.
     Returns (faiss_index, chunk_list) – chunk_list aligned with index rows.
+
+    index_type selects the structure:
+      "flat" – exact IndexFlatIP, cheapest for the built-in mini-corpus
+      "fp16" – exact scan over float16-quantized vectors; halves the
+               memory traffic of flat search at negligible recall loss
+      "sq8"  – exact scan over int8-quantized vectors (quarter traffic)
+      "hnsw" – graph ANN, sub-linear search at recall ≥0.95
+      "hnswsq" – hnsw graph over fp16-quantized storage; same search
+               complexity at half the index size on disk and in RAM
+      "ivf"  – inverted lists (nlist≈sqrt(N), nprobe=max(8, nlist//32));
+               prunes the scan to a few clusters per query
+      "ivfpq" – inverted lists over product-quantized codes; for very
+               large corpora (>100k chunks) where even one cluster's
+               full vectors would blow the cache. Needs enough training
+               vectors (~256 per sub-quantizer centroid)
+      "auto" – flat below HNSW_CHUNK_THRESHOLD chunks, hnsw above
+
+    quantize=True upgrades a flat index to int8 scalar quantization
+    ("sq8"): 4x smaller index file and 4x more vectors per cacheline on
+    the memory-bound exact scan, at negligible recall loss.
+
+    precision="int8" asks the encoder itself for quantized vectors
+    (sentence-transformers >= 2.7) and stores them through
+    QT_8bit_direct, enabling VNNI int8 dot products on recent CPUs.
+    Queries must then be encoded with the same precision, so this path
+    is for dedicated batch/offline setups; the default float32 path is
+    what the online retrieval agents expect.
     """
+    faiss = _faiss()
     texts = [c["text"] for c in chunks]
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    embeddings = embeddings.astype("float32")
 
-    # Normalise for cosine similarity
-    faiss.normalize_L2(embeddings)
+    if precision == "int8":
+        try:
+            emb_i8 = model.encode(
+                texts, batch_size=128, convert_to_numpy=True,
+                show_progress_bar=False, precision="int8",
+            )
+        except TypeError:
+            emb_i8 = None  # older sentence-transformers – float32 below
+        if emb_i8 is not None:
+            # QT_8bit_direct stores the values verbatim as 0..255 codes
+            embeddings = emb_i8.astype("float32") + 128.0
+            dim = embeddings.shape[1]
+            index = faiss.IndexScalarQuantizer(
+                dim, faiss.ScalarQuantizer.QT_8bit_direct,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+            index.train(embeddings)
+            index.add(embeddings)
+            return index, chunks, embeddings
+
+    # fp16 halves bandwidth on CUDA at no retrieval-quality cost for
+    # MiniLM; the encoder sorts by length internally ("smart batching")
+    # so each batch pads to its own max.
+    try:
+        import torch
+        if torch.cuda.is_available() and hasattr(model, "half"):
+            model.half()
+    except ImportError:
+        pass
+
+    # Large explicit batch amortizes tokenizer + kernel-launch overhead;
+    # normalizing inside the forward pass makes inner product = cosine
+    # without a separate normalize_L2 sweep. Unchanged chunk texts come
+    # straight from the per-text vector store.
+    embeddings = _embed_texts_cached(texts, model)
     dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)  # Inner product on normalised vectors = cosine
+
+    if index_type == "auto":
+        index_type = "hnsw" if len(chunks) >= HNSW_CHUNK_THRESHOLD else "flat"
+    if quantize and index_type == "flat":
+        index_type = "sq8"
+
+    if index_type == "ivf":
+        nlist = max(1, int(len(chunks) ** 0.5))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.nprobe = max(8, nlist // 32)
+    elif index_type == "ivfpq":
+        nlist = max(1, int(len(chunks) ** 0.5))
+        index = faiss.index_factory(
+            dim, f"IVF{nlist},PQ32", faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(embeddings)
+        index.nprobe = max(8, nlist // 32)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+    elif index_type == "hnswsq":
+        # HNSW graph over fp16-quantized storage: same sub-linear search,
+        # half the index file and page-cache footprint
+        index = faiss.IndexHNSWSQ(
+            dim, faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = 80
+        index.train(embeddings)
+    elif index_type in ("fp16", "sq8"):
+        qt = (faiss.ScalarQuantizer.QT_fp16 if index_type == "fp16"
+              else faiss.ScalarQuantizer.QT_8bit)
+        index = faiss.IndexScalarQuantizer(dim, qt, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+    else:
+        index = faiss.IndexFlatIP(dim)  # Inner product on normalised vectors = cosine
     index.add(embeddings)
     return index, chunks, embeddings
 
 
+def corpus_cache_key(model_name, chunk_size, chunk_overlap,
+                     index_type="auto", articles=None):
+    """
+    Deterministic key for the (corpus text, model, chunking, index) combo —
+    embeddings only change when one of these does.
+    """
+    if articles is None:
+        articles = get_corpus()
+    h = hashlib.sha256()
+    for article in articles:
+        h.update(article["text"].encode("utf-8"))
+    h.update(f"|{model_name}|{chunk_size}|{chunk_overlap}|{index_type}".encode())
+    return h.hexdigest()[:16]
+
+
+def build_or_load_index(model, model_name=None,
+                        chunk_size=500, chunk_overlap=100,
+                        index_type="auto", cache_dir="data/index_cache"):
+    """
+    Load the FAISS index, chunks, and embeddings from the on-disk cache,
+    or build and persist them on a miss.
+
+    Cold starts re-read the index (mmap) and the embeddings (.npy,
+    mmap_mode='r') instead of re-running the encoder over the whole corpus;
+    the key hashes the corpus text, model name, and chunking parameters, so
+    any change rebuilds automatically. `model_name` defaults to the name
+    carried by `model` itself, so a swapped encoder (HEALTHGUARD_EMBED_MODEL)
+    never picks up a stale index built for a different embedding space.
+    """
+    faiss = _faiss()
+    if model_name is None:
+        model_name = _model_hub_name(model) or type(model).__name__
+    key = corpus_cache_key(model_name, chunk_size, chunk_overlap, index_type)
+    index_path = os.path.join(cache_dir, f"{key}.index")
+    chunks_path = os.path.join(cache_dir, f"{key}.chunks.json")
+    emb_path = os.path.join(cache_dir, f"{key}.npy")
+
+    if all(os.path.exists(p) for p in (index_path, chunks_path, emb_path)):
+        try:
+            # Read-only mmap: pages are served straight from the page
+            # cache and faulted in lazily, so warm starts are near-free
+            # and RSS covers only the touched part of the index
+            index = faiss.read_index(
+                index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            with open(chunks_path) as f:
+                chunks = _intern_chunk_meta(json.load(f))
+            embeddings = np.load(emb_path, mmap_mode="r")
+            return index, chunks, embeddings
+        except Exception:
+            pass  # stale/corrupt cache – rebuild below
+
+    chunks = chunk_corpus(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    index, chunks, embeddings = build_faiss_index(chunks, model, index_type)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        faiss.write_index(index, index_path)
+        with open(chunks_path, "w") as f:
+            json.dump(chunks, f)
+        # float16 at rest halves the .npy file and the pages faulted in
+        # on the mmap read; the index keeps its own copy at full search
+        # precision, so only this side artifact is affected
+        np.save(emb_path, np.asarray(embeddings, dtype=np.float16))
+    except OSError:
+        pass  # read-only deployment – serve from memory only
+
+    return index, chunks, embeddings
+
+
+class ChunkStore:
+    """
+    Lazy chunk metadata backed by sqlite, keyed by FAISS row id. Only
+    the handful of rows a query actually touches are materialized, so
+    resident memory stays flat as the corpus grows; the full list would
+    otherwise sit in RAM for the life of the process.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __getitem__(self, row_id):
+        row = self._conn.execute(
+            "SELECT data FROM chunks WHERE id = ?", (int(row_id),)
+        ).fetchone()
+        if row is None:
+            raise IndexError(row_id)
+        return json.loads(row[0])
+
+
 def save_index(index, chunks, path="data/faiss_store"):
     """Persist FAISS index and metadata."""
     os.makedirs(path, exist_ok=True)
-    faiss.write_index(index, os.path.join(path, "index.faiss"))
-    with open(os.path.join(path, "chunks.json"), "w") as f:
-        json.dump(chunks, f)
+    _faiss().write_index(index, os.path.join(path, "index.faiss"))
+    # pickle protocol 5 loads several times faster than json for large
+    # chunk lists: no string escaping or UTF-8 re-parsing on the way in
+    with open(os.path.join(path, "chunks.pkl"), "wb") as f:
+        pickle.dump(chunks, f, protocol=5)
+    # Row-addressable copy for lazy loading via ChunkStore
+    conn = sqlite3.connect(os.path.join(path, "chunks.sqlite"))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, data TEXT)"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO chunks VALUES (?, ?)",
+        ((i, json.dumps(chunk)) for i, chunk in enumerate(chunks)),
+    )
+    conn.commit()
+    conn.close()
 
 
-def load_index(path="data/faiss_store"):
-    """Load persisted FAISS index and metadata."""
-    index = faiss.read_index(os.path.join(path, "index.faiss"))
-    with open(os.path.join(path, "chunks.json")) as f:
-        chunks = json.load(f)
-    return index, chunks
+def load_index(path="data/faiss_store", lazy=False):
+    """
+    Load persisted FAISS index and metadata. With lazy=True, chunk
+    metadata comes back as a ChunkStore that reads rows on demand
+    instead of materializing the whole list.
+    """
+    index = _faiss().read_index(os.path.join(path, "index.faiss"))
+    sqlite_path = os.path.join(path, "chunks.sqlite")
+    if lazy and os.path.exists(sqlite_path):
+        return index, ChunkStore(sqlite_path)
+    pkl_path = os.path.join(path, "chunks.pkl")
+    if os.path.exists(pkl_path):
+        with open(pkl_path, "rb") as f:
+            chunks = pickle.load(f)
+    else:
+        # stores written before the pickle switch
+        with open(os.path.join(path, "chunks.json")) as f:
+            chunks = json.load(f)
+    return index, _intern_chunk_meta(chunks)
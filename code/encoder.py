@@ -0,0 +1,157 @@
+"""
+Embedding encoder loader for HealthGuard AI.
+
+The stock sentence-transformers model runs FP32 PyTorch; exporting it to
+ONNX and quantizing the weights to int8 (dynamic) roughly doubles CPU
+encode throughput without changing the retrieval API. Everything here
+degrades gracefully to the plain SentenceTransformer when optimum /
+onnxruntime are not installed or no export directory exists.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+# "model2vec:<hub-id>" selects a static (lookup-only) model2vec encoder,
+# e.g. "model2vec:minishlab/potion-base-8M" — 10-100x faster than a
+# transformer forward pass at near-identical retrieval quality on short
+# clinical queries. Index embeddings are not cross-compatible between
+# models, so the corpus index rebuilds on switch (the cache key includes
+# the model name).
+DEFAULT_MODEL = os.environ.get("HEALTHGUARD_EMBED_MODEL", "all-MiniLM-L6-v2")
+DEFAULT_ONNX_DIR = os.environ.get("HEALTHGUARD_ONNX_DIR", "onnx_int8")
+
+
+class ORTEmbeddingWrapper:
+    """
+    Minimal `.encode`-compatible wrapper around an ONNX feature extractor,
+    so the rest of the pipeline can treat it like a SentenceTransformer.
+    """
+
+    def __init__(self, ort_model, tokenizer, max_length: int = 256,
+                 hub_name: str | None = None):
+        self._model = ort_model
+        self._tokenizer = tokenizer
+        self._max_length = max_length
+        # Identifies the embedding space for cache keys (data.corpus)
+        self._hub_name = hub_name
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False,
+               **_kwargs) -> np.ndarray:
+        texts = list(texts)
+        # Group similar-length texts so each batch pads to its own max
+        # instead of the global one — attention cost is quadratic in the
+        # padded length, so skewed batches waste most of their FLOPs.
+        # (SentenceTransformer.encode does the same internally.)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            enc = self._tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self._max_length,
+                return_tensors="np",
+            )
+            hidden = self._model(**enc).last_hidden_state
+            # Mean pooling over non-padding tokens (same as the ST model)
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings.append(pooled)
+
+        out = np.concatenate(embeddings, axis=0).astype("float32")
+        # Undo the length sort so rows align with the input order
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(texts))
+        out = out[inverse]
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.clip(norms, 1e-12, None)
+        return out
+
+
+class StaticModelWrapper:
+    """
+    `.encode`-compatible wrapper around a model2vec StaticModel, which is
+    a pure embedding-table lookup (no attention), so encoding is
+    memory-bound NumPy work.
+    """
+
+    def __init__(self, static_model, hub_name: str | None = None):
+        self._model = static_model
+        # Identifies the embedding space for cache keys (data.corpus)
+        self._hub_name = hub_name
+
+    def encode(self, texts, batch_size: int = 1024, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, show_progress_bar: bool = False,
+               **_kwargs) -> np.ndarray:
+        out = np.asarray(
+            self._model.encode(list(texts), batch_size=batch_size),
+            dtype="float32",
+        )
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out = out / np.clip(norms, 1e-12, None)
+        return out
+
+
+def export_quantized_onnx(model_name: str = DEFAULT_MODEL,
+                          save_dir: str = DEFAULT_ONNX_DIR) -> str:
+    """
+    One-off offline step: export the sentence-transformer to ONNX and
+    quantize the weights to int8. Returns the directory load_encoder()
+    will pick up on the next start.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    fp32_dir = save_dir + "_fp32"
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+    model.save_pretrained(fp32_dir)
+
+    quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+    return save_dir
+
+
+def load_encoder(model_name: str = DEFAULT_MODEL,
+                 onnx_dir: str = DEFAULT_ONNX_DIR,
+                 device: str | None = None):
+    """
+    Load the retrieval encoder: a model2vec static model for
+    "model2vec:<hub-id>" names, else the int8 ONNX export when one
+    exists, otherwise the standard SentenceTransformer. `device`
+    (e.g. "cuda") applies to the PyTorch path; the ONNX export and
+    model2vec run on CPU.
+    """
+    if model_name.startswith("model2vec:"):
+        try:
+            from model2vec import StaticModel
+            return StaticModelWrapper(
+                StaticModel.from_pretrained(model_name.split(":", 1)[1]),
+                hub_name=model_name,
+            )
+        except ImportError:
+            model_name = "all-MiniLM-L6-v2"  # model2vec not installed
+    if device is None and os.path.isdir(onnx_dir):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+            ort_model = ORTModelForFeatureExtraction.from_pretrained(onnx_dir)
+            tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+            # int8 vectors drift slightly from the fp32 ones, so the
+            # export gets its own cache namespace
+            return ORTEmbeddingWrapper(
+                ort_model, tokenizer, hub_name=f"{model_name}@onnx-int8"
+            )
+        except Exception:
+            pass  # corrupt/partial export – fall back to PyTorch
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device=device)
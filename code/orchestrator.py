@@ -9,14 +9,21 @@ Coordinates the multi-agent pipeline:
 
 from __future__ import annotations
 
+import threading
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from typing import Any
 
+import numpy as np
+
 from agents.agents import (
+    Finding,
     extract_symptoms,
     generate_differential,
+    prewarm_query_vector,
     retrieve_literature,
+    retrieve_literature_multi,
     validate_output,
 )
 
@@ -24,13 +31,29 @@ from agents.agents import (
 @dataclass
 class PipelineResult:
     """Container for the full pipeline output."""
-    findings: list[dict] = field(default_factory=list)
+    findings: list[Finding] = field(default_factory=list)
     literature: list[dict] = field(default_factory=list)
     differential: str = ""
     validation: dict = field(default_factory=dict)
     timings: dict = field(default_factory=dict)
     error: str | None = None
 
+    def literature_arrays(self) -> tuple[np.ndarray, list[str], list[str]]:
+        """
+        Structure-of-arrays view of `literature`: (scores, chunk_ids,
+        titles), with scores as a contiguous float32 ndarray so ranking
+        and filtering run as vectorized NumPy ops (np.argpartition,
+        boolean masks) instead of Python-level loops over dicts. The
+        dict list stays the canonical representation.
+        """
+        scores = np.fromiter(
+            (c["relevance_score"] for c in self.literature),
+            dtype=np.float32, count=len(self.literature),
+        )
+        chunk_ids = [c["chunk_id"] for c in self.literature]
+        titles = [c["title"] for c in self.literature]
+        return scores, chunk_ids, titles
+
 
 def run_healthguard(
     notes: str,
@@ -38,6 +61,8 @@ def run_healthguard(
     faiss_index,
     chunks: list[dict],
     top_k: int = 8,
+    extra_queries: list[str] | None = None,
+    prefetched_literature: list[dict] | None = None,
 ) -> PipelineResult:
     """
     Main orchestrator: run the full HealthGuard AI pipeline.
@@ -54,6 +79,14 @@ def run_healthguard(
         Chunk metadata aligned with the FAISS index.
     top_k : int
         Number of literature chunks to retrieve.
+    extra_queries : list[str], optional
+        Additional retrieval queries (e.g. candidate condition names).
+        When given, all queries are searched in one stacked FAISS call
+        and the best-scoring chunks across them are kept.
+    prefetched_literature : list[dict], optional
+        Already-retrieved literature chunks for these notes (e.g. from
+        retrieve_literature_batch over several cases at once); skips the
+        per-case encode and search entirely.
 
     Returns
     -------
@@ -61,11 +94,32 @@ def run_healthguard(
     """
     result = PipelineResult()
 
+    # perf_counter is monotonic (wall clock can jump under NTP) and the
+    # raw floats are kept so downstream analysis doesn't re-parse rounded
+    # strings; a stage is timed even when it raises partway through.
+    @contextmanager
+    def _stage(name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            result.timings[name] = time.perf_counter() - t0
+
     try:
         # --- Agent 1: Symptom Extraction ---
-        t0 = time.time()
-        result.findings = extract_symptoms(notes)
-        result.timings["extract_symptoms"] = round(time.time() - t0, 2)
+        # Extraction is I/O-bound when LLM-backed, so the retrieval query
+        # for the rule-based reading of the notes is pre-encoded on a side
+        # thread meanwhile; when both extractors agree (always, in
+        # fallback mode), retrieval then starts from a warm vector.
+        if prefetched_literature is None:
+            warmer = threading.Thread(
+                target=prewarm_query_vector, args=(notes, embedding_model),
+                daemon=True,
+            )
+            warmer.start()
+
+        with _stage("extract_symptoms"):
+            result.findings = extract_symptoms(notes)
 
         if not result.findings:
             result.error = (
@@ -75,25 +129,38 @@ def run_healthguard(
             return result
 
         # --- Agent 2: Literature Retrieval ---
-        t0 = time.time()
-        result.literature = retrieve_literature(
-            result.findings, embedding_model, faiss_index, chunks, top_k=top_k
-        )
-        result.timings["retrieve_literature"] = round(time.time() - t0, 2)
+        # When the caller supplies extra queries, they are stacked with
+        # the combined-findings query into one (nq, d) matrix so FAISS
+        # searches them in a single batched call (one GEMM; parallelized
+        # across rows). The default path issues only the combined query —
+        # same retrieval set as always, one encode.
+        with _stage("retrieve_literature"):
+            if prefetched_literature is not None:
+                result.literature = prefetched_literature
+            else:
+                queries = list(extra_queries) if extra_queries else []
+                if queries:
+                    result.literature = retrieve_literature_multi(
+                        result.findings, queries, embedding_model,
+                        faiss_index, chunks, top_k=top_k,
+                    )
+                else:
+                    result.literature = retrieve_literature(
+                        result.findings, embedding_model, faiss_index,
+                        chunks, top_k=top_k,
+                    )
 
         # --- Agent 3: Differential Diagnosis ---
-        t0 = time.time()
-        result.differential = generate_differential(
-            result.findings, result.literature
-        )
-        result.timings["generate_differential"] = round(time.time() - t0, 2)
+        with _stage("generate_differential"):
+            result.differential = generate_differential(
+                result.findings, result.literature
+            )
 
         # --- Agent 4: Validation ---
-        t0 = time.time()
-        result.validation = validate_output(
-            result.differential, result.literature
-        )
-        result.timings["validate_output"] = round(time.time() - t0, 2)
+        with _stage("validate_output"):
+            result.validation = validate_output(
+                result.differential, result.literature
+            )
 
     except Exception as e:
         result.error = f"Pipeline error: {e}"